@@ -2,13 +2,81 @@
 Tic Tac Toe Player
 """
 
+import hashlib
 import math
-import copy
+import os
+import pickle
 
 X = "X"
 O = "O"
 EMPTY = None
 
+# Each player's cells are kept as a 9-bit mask, cell (i, j) being bit 3 * i + j
+FULL_BOARD = 0b111_111_111
+
+# Masks of the 8 winning lines: 3 rows, 3 columns and 2 diagonals
+WINS = (0b000_000_111, 0b000_111_000, 0b111_000_000,
+        0b001_001_001, 0b010_010_010, 0b100_100_100,
+        0b100_010_001, 0b001_010_100)
+
+# WIN_LOOKUP[mask] is True if the cells in mask complete any winning line
+WIN_LOOKUP = tuple(
+    any(mask & win == win for win in WINS) for mask in range(FULL_BOARD + 1)
+)
+
+# Moves are tried center first, then corners, then edges, so that the
+# strongest replies are searched early and alpha-beta prunes more
+ORDER = ((1, 1), (0, 0), (0, 2), (2, 0), (2, 2), (0, 1), (1, 0), (1, 2), (2, 1))
+ORDER_BITS = tuple(1 << (3 * i + j) for i, j in ORDER)
+
+# MOVES[free] lists a single-bit mask for every cell of the free mask, in ORDER
+MOVES = tuple(
+    tuple(bit for bit in ORDER_BITS if free & bit) for free in range(FULL_BOARD + 1)
+)
+
+# The 8 symmetries of the board (4 rotations, each with or without a mirror),
+# SYMS[s][cell] being the cell that cell 3 * i + j is moved to by symmetry s
+ROTATE = tuple(3 * j + 2 - i for i in range(3) for j in range(3))
+MIRROR = tuple(3 * i + 2 - j for i in range(3) for j in range(3))
+
+
+def symmetry(mirror, turns):
+    """
+    Returns the symmetry that mirrors the board when `mirror` is True,
+    then rotates it by `turns` quarter turns.
+    """
+    sym = MIRROR if mirror else tuple(range(9))
+    for _ in range(turns):
+        sym = tuple(ROTATE[cell] for cell in sym)
+    return sym
+
+
+SYMS = tuple(symmetry(mirror, turns) for mirror in (False, True) for turns in range(4))
+
+# INVERSE[s] is the symmetry undoing SYMS[s]
+INVERSE = tuple(SYMS.index(tuple(sorted(range(9), key=sym.__getitem__))) for sym in SYMS)
+
+# SYMMETRIC[s][mask] is the mask with each of its cells moved by SYMS[s]
+SYMMETRIC = tuple(
+    tuple(sum(1 << sym[cell] for cell in range(9) if mask >> cell & 1) for mask in range(FULL_BOARD + 1))
+    for sym in SYMS
+)
+
+# Transposition table of searched positions, kept across the whole game:
+# maps the canonical key of a position to (score, flag, depth, move) where the
+# flag tells if score is exact, a lower bound or an upper bound of the negamax
+# value searched `depth` moves ahead, and move is the best move that search
+# found, as a cell of the canonical board
+TRANSPOSITIONS = {}
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Scores are 1, 0 or -1, so any value above 1 works as an infinite bound
+LIMIT = 2
+
+# Optimal action of every reachable board, cached in a pickle next to this file
+# together with the hash of the source that solved it
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tictactoe.tt.pkl")
+
 
 def initial_state():
     """
@@ -23,45 +91,15 @@ def player(board):
     """
     Returns player who has the next turn on a board.
     """
-    # No more possible moves to be made if there is a winner
-    if winner(board) is not None:
-        return None
-
-    # If there is a no winner
-    xCount = 0
-    oCount = 0
-
-    for row in board:
-        for col in row:
-            if col == X:
-                xCount += 1
-            elif col == O:
-                oCount += 1
-    
-    # Check if there is any remaining spaces
-    if xCount + oCount == 9:
-        return None
-    elif xCount == oCount:
-        return X
-    else:
-        return O
+    return classify_bits(*board_to_bits(board))[2]
 
 
 def actions(board):
     """
-    Returns set of all possible actions (i, j) available on the board.
+    Returns list of all possible actions (i, j) available on the board,
+    in the order they are best explored.
     """
-    possibleActions = set()
-
-    for row in range(len(board)):
-        for col in range(len(board[row])):
-            if board[row][col] == EMPTY:
-                possibleActions.add((row, col))
-
-    if len(possibleActions) != 0:
-        return possibleActions
-    else:
-        return None
+    return [action for action in ORDER if board[action[0]][action[1]] == EMPTY]
 
 
 def result(board, action):
@@ -72,8 +110,8 @@ def result(board, action):
     if action is None:
         raise Exception("Invalid Action Made")
 
-    # Deep Copy of the board
-    resultBoard = copy.deepcopy(board)
+    # Copy of the board, rows hold immutable values so copying each row is enough
+    resultBoard = [row[:] for row in board]
     
     # Get current Player
     currentPlayer = player(board)
@@ -88,83 +126,14 @@ def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
-    # Check if player has won vertically
-    def checkVerical(player):
-        for col in range(len(board)):
-            if board[0][col] == player and board[1][col] == player and board[2][col] == player:
-                return True
-        return False
-
-    # Check if player has won horizontally
-    def checkHorizontal(player):
-        for row in range(len(board[0])):
-            if board[row][0] == player and board[row][1] == player and board[row][2] == player:
-                return True
-        return False
-
-    # Check if player has won diagonally
-    def checkDiagonally(player):
-        diagonal_fromTopLeft = True
-        diagonal_fromBottomLeft = True
-        
-        # Check Top Left to Bottom Right
-        for i in range(len(board)):
-            # print(f"{i},{i}, topleft")
-            if board[i][i] != player:
-                diagonal_fromTopLeft = False      
-
-        # Check Bottom Left to Top Right
-        for col in reversed(range(len(board))):
-            row = (len(board) - 1) - col
-            # print(f"{row},{col} bottomLeft")
-            if board[row][col] != player:
-                diagonal_fromBottomLeft = False
-
-        # If any return true, player has won
-        if diagonal_fromBottomLeft or diagonal_fromTopLeft:
-            return True
-        else:
-            return False
-
-    # Check if player has won in any way possible
-    def checkPlayer(player):
-        if checkHorizontal(player) or checkVerical(player) or checkDiagonally(player):
-            return True
-        else:
-            return False
-        
-    if checkPlayer(X):
-        return X
-    elif checkPlayer(O):
-        return O
-    else:
-        return None
+    return classify_bits(*board_to_bits(board))[0]
 
 
 def terminal(board):
     """
     Returns True if game is over, False otherwise.
     """
-    # If there is a winner
-    if winner(board) is not None:
-        return True
-    
-    # If there is a no winner
-    xCount = 0
-    oCount = 0
-
-    for row in board:
-        for col in row:
-            if col == X:
-                xCount += 1
-            elif col == O:
-                oCount += 1
-    
-    # Check if there is any remaining spaces
-    if xCount + oCount == 9:
-        return True
-    else:
-        return False
+    return classify_bits(*board_to_bits(board))[1]
 
 
 def utility(board):
@@ -185,73 +154,262 @@ def minimax(board):
     """
     Returns the optimal action for the current player on the board.
     """
-    # ALPHA - best already explored option along path to the root for maximizer
-    # BETA - best already explored option along path to the root for minimizer
-
-    def MAX_VALUE(board, alpha, beta):
-        if terminal(board):
-            return utility(board)
-
-        score = -999
-        for action in actions(board):
-            score = max(score, MIN_VALUE(result(board, action), alpha, beta))
-            alpha = max(alpha, score)
-
-            # if the best option for maximizer is > best option for beta
-            # no need to look at other actions
-            if alpha > beta:
-                break
-        
-        return score
-
-    # If AI is O, the Ai will want to generate the lowest maximum score
-    def MIN_VALUE(board, alpha, beta):
-        if terminal(board):
-            return utility(board)
-
-        score = 999 
-        for action in actions(board):
-            score = min(score, MAX_VALUE(result(board, action), alpha, beta))
-            beta = min(beta, score)
-
-            # if the best option for minimizer is < best option for alpha
-            # no need to look at other actions
-            if beta < alpha:
-                break
-        
-        return score
-    
-    # Get the current Plyer
-    currentPlayer = player(board)
+    x, o = board_to_bits(board)
+    if (x, o) in BEST_ACTIONS:
+        return BEST_ACTIONS[(x, o)]
 
-    # Create a List of Nodes to check for the best option
-    nodeList = []
+    # Only boards that cannot come up in a real game are missing from the table
+    return search(x, o)
+
+
+def search(x, o):
+    """
+    Returns the optimal action (i, j) for the current player on the (x, o)
+    board, or None if the game is over.
+    """
+    _, over, currentPlayer, moves = classify_bits(x, o)
+    if over:
+        return None
+
+    # Search from the point of view of the current player
     if currentPlayer == X:
-        # Add possible actions to the current board into the nodeList
-        for action in actions(board):
-            nodeList.append(Node(board, action, MIN_VALUE(result(board, action), -999, 999)))
-
-        bestNode = nodeList[0]
-        # Check and Returns Node with the best score
-        for node in nodeList:
-            if node.score > bestNode.score:
-                bestNode = node
-        return bestNode.action   
+        me, opp = x, o
+    else:
+        me, opp = o, x
+
+    # Search one more move ahead each time, trying the best moves of the last
+    # depth first. Once the search reaches the end of the game scores are exact
+    for depth in range(len(moves)):
+
+        # A move is worth the opposite of what it is worth to the opponent
+        scores = {bit: -negamax(opp, me | bit, depth, -LIMIT, LIMIT) for bit in moves}
+        moves.sort(key=lambda bit: -scores[bit])
+
+        # A win found within the depth is a real win, nothing can do better
+        if scores[moves[0]] == 1:
+            break
+
+    # Returns the move with the best score
+    return bit_to_action(moves[0])
+
+
+def negamax(me, opp, depth, alpha, beta):
+    """
+    Returns the score of the board for the player about to move, who holds
+    the cells in the `me` mask: 1 for a win, -1 for a loss, 0 for a tie.
+    `opp` holds the cells of the player who just moved. Games still going
+    after `depth` more moves are scored as ties.
+    """
+    # ALPHA - best already explored option along path to the root for the player to move
+    # BETA - best already explored option for the opponent, as seen by the player to move
+
+    # Only the player who just moved can have completed a line
+    if WIN_LOOKUP[opp]:
+        return -1
+    free = FULL_BOARD & ~(me | opp)
+    if free == 0 or depth == 0:
+        return 0
+
+    # Searching past the end of the game gives the same scores, so all such
+    # searches share the same depth and can reuse each other's entries
+    depth = min(depth, free.bit_count())
+
+    # Reuse the score of this position if it, or a rotation or mirror of it,
+    # was reached by another move order and searched at least as deep
+    key, sym = canonical(me, opp)
+    moves = MOVES[free]
+    entry = TRANSPOSITIONS.get(key)
+    if entry is not None:
+        value, flag, entryDepth, entryMove = entry
+        if entryDepth >= depth:
+            if flag == EXACT:
+                return value
+            elif flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        # Try the best move of the earlier search first, moved back from the
+        # canonical board onto this one
+        entryMove = SYMMETRIC[INVERSE[sym]][entryMove]
+        moves = (entryMove,) + MOVES[free ^ entryMove]
+
+    window = (alpha, beta)
+    score = -LIMIT
+    for bit in moves:
+        moveScore = -negamax(opp, me | bit, depth - 1, -beta, -alpha)
+        if moveScore > score:
+            score = moveScore
+            bestMove = bit
+        alpha = max(alpha, score)
+
+        # if the best option for the player to move is >= best option for the
+        # opponent, the opponent will not let this position happen
+        if alpha >= beta:
+            break
+
+    # Keep the deeper of the two searches
+    if entry is None or entry[2] <= depth:
+        store_transposition(key, score, *window, depth, SYMMETRIC[sym][bestMove])
+    return score
+
+
+def solve_all():
+    """
+    Returns a dictionary mapping the (x, o) bitmasks of every unfinished
+    board reachable from the initial state to its optimal action.
+    """
+    bestActions = dict()
+    frontier = [(0, 0)]
+
+    while frontier:
+        x, o = frontier.pop()
+        if (x, o) in bestActions:
+            continue
+
+        _, over, currentPlayer, moves = classify_bits(x, o)
+        if over:
+            continue
+
+        # The transposition table is shared, so each search mostly reuses
+        # the scores found by the previous ones
+        bestActions[(x, o)] = search(x, o)
+        for bit in moves:
+            if currentPlayer == X:
+                frontier.append((x | bit, o))
+            else:
+                frontier.append((x, o | bit))
+
+    return bestActions
+
+
+def load_best_actions():
+    """
+    Returns the table of optimal actions, solving the game and saving the
+    table next to this file the first time so later imports only load it.
+    """
+    # Any change to this file may change the search, so a table saved by
+    # another version of it is solved again
+    with open(os.path.abspath(__file__), "rb") as f:
+        sourceHash = hashlib.sha256(f.read()).hexdigest()
+
+    try:
+        with open(TABLE_PATH, "rb") as f:
+            saved = TableUnpickler(f).load()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, ImportError):
+        saved = None
+
+    if (isinstance(saved, tuple) and len(saved) == 2 and saved[0] == sourceHash
+            and valid_table(saved[1])):
+        return saved[1]
+
+    bestActions = solve_all()
+    try:
+        with open(TABLE_PATH, "wb") as f:
+            pickle.dump((sourceHash, bestActions), f)
+    except OSError:
+        # Not being able to save the table only costs solving it again
+        pass
+
+    return bestActions
+
+
+class TableUnpickler(pickle.Unpickler):
+    """
+    Unpickler for the saved table, which only holds strings, ints, tuples and
+    a dict. Those never need a class, so refusing every class stops a
+    tampered file from running code when it is loaded.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in the table")
+
+
+def valid_table(table):
+    """
+    Returns True if table maps (x, o) bitmask pairs to (i, j) actions.
+    """
+    if not isinstance(table, dict):
+        return False
+
+    def valid_pair(pair, low, high):
+        return (isinstance(pair, tuple) and len(pair) == 2
+                and all(type(value) is int and low <= value <= high for value in pair))
+
+    return all(
+        valid_pair(board, 0, FULL_BOARD) and valid_pair(action, 0, 2)
+        for board, action in table.items()
+    )
+
+
+def canonical(me, opp):
+    """
+    Returns (key, s) where key is the smallest me | opp << 9 key among the 8
+    symmetric versions of the position, all of which have the same score,
+    and s the index in SYMS of the symmetry that gives it.
+    The player to move never has more cells, so the key tells who moves.
+    """
+    return min((table[me] | table[opp] << 9, s) for s, table in enumerate(SYMMETRIC))
+
+
+def store_transposition(key, score, alpha, beta, depth, move):
+    """
+    Records the score and best move an alpha-beta search `depth` moves deep
+    with window (alpha, beta) found for the position `key` in the
+    transposition table.
+    """
+    if score <= alpha:
+        TRANSPOSITIONS[key] = (score, UPPER, depth, move)
+    elif score >= beta:
+        TRANSPOSITIONS[key] = (score, LOWER, depth, move)
     else:
-        # Add possible actions to the current board into the nodeList
-        for action in actions(board):
-            nodeList.append(Node(board, action, MAX_VALUE(result(board, action), -999, 999)))
-        
-        bestNode = nodeList[0]
-        # Check and Returns Node with the best score
-        for node in nodeList:
-            if node.score < bestNode.score:
-                bestNode = node
-        return bestNode.action
-
-
-class Node():
-    def __init__(self, state, action, score):
-        self.state = state
-        self.action = action
-        self.score = score
\ No newline at end of file
+        TRANSPOSITIONS[key] = (score, EXACT, depth, move)
+
+
+def board_to_bits(board):
+    """
+    Returns the (x, o) bitmasks of the cells taken by each player on the board.
+    """
+    x = o = 0
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell == X:
+                x |= 1 << (3 * i + j)
+            elif cell == O:
+                o |= 1 << (3 * i + j)
+    return x, o
+
+
+def bit_to_action(bit):
+    """
+    Returns the action (i, j) of the cell stored in a single-bit mask.
+    """
+    return divmod(bit.bit_length() - 1, 3)
+
+
+def classify_bits(x, o):
+    """
+    Returns (winner, terminal, player, moves) for the (x, o) board, moves
+    holding a single-bit mask for every empty cell.
+    """
+    if WIN_LOOKUP[x]:
+        won = X
+    elif WIN_LOOKUP[o]:
+        won = O
+    else:
+        won = None
+
+    # No more possible moves to be made if there is a winner or no remaining spaces
+    free = FULL_BOARD & ~(x | o)
+    if won is not None or free == 0:
+        return won, True, None, []
+
+    moves = list(MOVES[free])
+
+    currentPlayer = X if x.bit_count() == o.bit_count() else O
+    return None, False, currentPlayer, moves
+
+
+BEST_ACTIONS = load_best_actions()
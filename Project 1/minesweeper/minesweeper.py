@@ -1,6 +1,8 @@
 import itertools
 import random
 
+from collections import deque
+
 
 class Minesweeper():
     """
@@ -15,20 +17,22 @@ class Minesweeper():
         self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
-
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        self.board = [[False] * width for _ in range(height)]
+
+        # Add mines randomly, drawing distinct cells so no draw is ever wasted
+        for index in random.sample(range(height * width), mines):
+            i, j = divmod(index, width)
+            self.mines.add((i, j))
+            self.board[i][j] = True
+
+        # Count the mines around every cell once, so that
+        # looking up the count of a cell is a constant time access
+        self.mine_counts = [[0] * width for _ in range(height)]
+        for i, j in self.mines:
+            for row in range(max(0, i - 1), min(height, i + 2)):
+                for col in range(max(0, j - 1), min(width, j + 2)):
+                    if (row, col) != (i, j):
+                        self.mine_counts[row][col] += 1
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -58,24 +62,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.mine_counts[i][j]
 
     def won(self):
         """
@@ -98,9 +86,20 @@ class Sentence():
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash(self.key())
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
+    def key(self):
+        """
+        Returns an immutable snapshot of the sentence, equal for equal
+        sentences, to be used as a dictionary key.
+        Marking a cell changes the key of a sentence holding that cell.
+        """
+        return (frozenset(self.cells), self.count)
+
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
@@ -163,8 +162,24 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Sentences about the game known to be true, keyed by Sentence.key()
+        self.knowledge = dict()
+
+        # Sentences of the knowledge that each cell appears in
+        self.cell_sentences = dict()
+
+        # Cells within one row and column of each cell, not including
+        # the cell itself. The board never changes so they are built once
+        self.neighbors = {
+            (i, j): frozenset(
+                (row, col)
+                for row in range(max(0, i - 1), min(height, i + 2))
+                for col in range(max(0, j - 1), min(width, j + 2))
+                if (row, col) != (i, j)
+            )
+            for i in range(height)
+            for j in range(width)
+        }
 
     def mark_mine(self, cell):
         """
@@ -172,8 +187,10 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+
+        # Once marked the cell is gone from every sentence, so drop its entry
+        for sentence in self.cell_sentences.pop(cell, ()):
+            self.update_sentence(sentence, sentence.mark_mine, cell)
 
     def mark_safe(self, cell):
         """
@@ -181,8 +198,27 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+
+        for sentence in self.cell_sentences.pop(cell, ()):
+            self.update_sentence(sentence, sentence.mark_safe, cell)
+
+    def update_sentence(self, sentence, mark, cell):
+        """
+        Applies `mark` (the sentence's mark_mine or mark_safe) for `cell`,
+        moving the sentence to its new key in the knowledge.
+        """
+        key = sentence.key()
+
+        # The index can still hold sentences dropped as duplicates, leave them be
+        if self.knowledge.get(key) is not sentence:
+            return
+
+        del self.knowledge[key]
+        mark(cell)
+
+        # Sentences with no cells left are dropped, all of them are already known
+        if len(sentence.cells) != 0:
+            self.knowledge.setdefault(sentence.key(), sentence)
 
     def add_knowledge(self, cell, count):
         """
@@ -199,117 +235,75 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
-        # Cleans up the knowledge to ensure that all mines in current knowledge and
-        # all safe positions are updated before a new statement is checked
-        def check_knowledge():
-            update = False
-            mines = set()
-            safes = set()
-
-            # Record known mines & known safes to be updated
-            for sentence in self.knowledge:
-                if len(sentence.cells) == 0:
-                    self.knowledge.remove(sentence)
+        # Sentences still to be checked for conclusions and subsets
+        pending = deque()
+
+        # Marks cells through `mark` (self.mark_mine or self.mark_safe), queueing
+        # the sentences holding them again since marking changes those sentences
+        def mark_cells(cells, mark):
+            for cell in list(cells):
+                pending.extend(self.cell_sentences.get(cell, ()))
+                mark(cell)
+
+        # Mark that the cell as a moved is made.
+        # And since the move is made, the cell should be marked as safe
+        self.moves_made.add(cell)
+        mark_cells([cell], self.mark_safe)
+
+        # Add all surrounding cells not already known into a statement,
+        # taking the known mines out of the count
+        neighbors = self.neighbors[cell]
+        new_set = neighbors - self.safes - self.mines
+        count -= len(neighbors & self.mines)
+        pending.append(Sentence(new_set, count))
+
+        # Check sentences until no more conclusions can be drawn. Only the
+        # sentences changed by a new mark are checked again, not the whole knowledge
+        while pending:
+            sentence = pending.popleft()
+            key = sentence.key()
+
+            if self.knowledge.get(key) is not sentence:
+                # New sentences may hold cells marked since they were made
+                for cell in sentence.cells & self.mines:
+                    sentence.mark_mine(cell)
+                for cell in sentence.cells & self.safes:
+                    sentence.mark_safe(cell)
+                key = sentence.key()
+
+                # Skip empty sentences and sentences that are already known
+                if len(sentence.cells) == 0 or key in self.knowledge:
                     continue
-                
-                if sentence.known_mines() is not None:
-                    for cell in sentence.known_mines():
-                        mines.add(cell)
-                    update = True
-            
-                if sentence.known_safes() is not None:
-                    for cell in sentence.known_safes():
-                        safes.add(cell)
-                    update = True
-            
-            # Update the records. If there is an update, run another
-            # check to ensure that no more updates can be found
-            if update == True:
-                for cell in mines:
-                    self.mark_mine(cell)
-                for cell in safes:
-                    self.mark_safe(cell)
-                check_knowledge()
-
-        def check_and_add_sentence(sentence):
-            check_knowledge()       # Called since a new statement is about to be checked
-
-            # Check if sentence is already added before
-            if sentence in self.knowledge:
-                return
-
-            # Check if new sentence is empty, do not do anything
-            if len(sentence.cells) == 0:
-                return
-            
+
             # Check if sentence knows all are mines
-            if sentence.known_mines() is not None:
-                for cell in sentence.known_mines():
-                    self.mark_mine(cell)
-                return
-            
+            if sentence.known_mines():
+                mark_cells(sentence.known_mines(), self.mark_mine)
+                continue
+
             # Check if sentence knows if all are safe
-            if sentence.known_safes() is not None:
-                for cell in sentence.known_safes():
-                    self.mark_safe(cell)
-                return
+            if sentence.known_safes():
+                mark_cells(sentence.known_safes(), self.mark_safe)
+                continue
 
             # Add sentence into knowledge
-            self.knowledge.append(sentence)
-            
-            # Check for subsets
-            for info in self.knowledge:
-                # Remove knowledge if empty to save on memory
-                # Easier to debug if print out knowledge
-                if len(info.cells) == 0:
-                    self.knowledge.remove(info)
-                    continue
-
-                cell_difference = None
-                count_difference = None
-
-                # If there is a subset, get the difference
+            if key not in self.knowledge:
+                self.knowledge[key] = sentence
+                for cell in sentence.cells:
+                    self.cell_sentences.setdefault(cell, []).append(sentence)
+
+            # Only sentences sharing a cell with this one can be its subset or superset
+            related = dict()
+            for cell in sentence.cells:
+                for info in self.cell_sentences.get(cell, ()):
+                    if info is not sentence and self.knowledge.get(info.key()) is info:
+                        related[info.key()] = info
+
+            # If there is a subset, check the difference as a new sentence as well
+            for info in related.values():
                 if info.cells.issubset(sentence.cells):
-                    cell_difference = sentence.cells.difference(info.cells)
-                    count_difference = sentence.count - info.count
+                    pending.append(Sentence(sentence.cells - info.cells, sentence.count - info.count))
                 elif sentence.cells.issubset(info.cells):
-                    cell_difference = info.cells.difference(sentence.cells)
-                    count_difference = info.count - sentence.count
-                
-                # If there is a subset, check the new sentence as well.
-                if cell_difference is not None and count_difference is not None:
-                    new_sentence = Sentence(cell_difference, count_difference)
-                    # print(f"new sentence: {new_sentence}")
-                    check_and_add_sentence(new_sentence)
-
-        # Mark that the cell as a moved is made.
-        # And since the move is made, the cell should be added as safe
-        self.moves_made.add(cell)
-        self.safes.add(cell)
-
-        # Add all surrounding into a statement
-        cell_row, cell_col = cell   # Get row and col for current cell
-        new_set = set()
-        for row in range(cell_row - 1, cell_row + 2):
-            for col in range(cell_col - 1, cell_col + 2):
-                
-                # Ignore if is ownself
-                if (row, col) == cell:
-                    continue
-                # Skip if out of index
-                elif (row < 0 or row >= self.width or col < 0 or col >= self.height):
-                    continue
-                # Skip if already known is a safe cell
-                elif (row, col) in self.safes:
-                    continue
-                # Skip if already known is a mine
-                elif (row, col) in self.mines:
-                    count -= 1
-                    continue
-
-                new_set.add((row, col))
-        new_sentence = Sentence(new_set, count)
-        check_and_add_sentence(new_sentence)
+                    pending.append(Sentence(info.cells - sentence.cells, info.count - sentence.count))
 
     def make_safe_move(self):
         """
@@ -322,7 +316,7 @@ class MinesweeperAI():
         """
         # print(f"Safes: {self.safes.difference(self.moves_made)}")
         # print(f"Mines: {self.mines}")
-        # my_string = "\n".join(map(str, self.knowledge))
+        # my_string = "\n".join(map(str, self.knowledge.values()))
         # print(f"Knowledge = {my_string}")
         for cell in self.safes:
             if cell in self.moves_made:
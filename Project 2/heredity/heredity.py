@@ -1,5 +1,4 @@
 import csv
-import itertools
 import sys
 
 PROBS = {
@@ -36,6 +35,19 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Probability for a parent with 0, 1 or 2 copies of the gene to pass one on to a child
+INHERIT = (PROBS["mutation"], 0.5, 1 - PROBS["mutation"])
+
+# Probability for a parent with 0, 1 or 2 copies of the gene not to pass one on
+NO_INHERIT = (1 - PROBS["mutation"], 0.5, PROBS["mutation"])
+
+# PROBS["gene"] and PROBS["trait"] as tables indexed by gene count, then by trait
+GENE = tuple(PROBS["gene"][gene_count] for gene_count in range(3))
+TRAIT = tuple(
+    (PROBS["trait"][gene_count][False], PROBS["trait"][gene_count][True])
+    for gene_count in range(3)
+)
+
 
 def main():
 
@@ -60,26 +72,46 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
+    # Sets of people are handled as bitmasks, bit i standing for the i-th person
+    index = {person: i for i, person in enumerate(people)}
+    everyone = (1 << len(people)) - 1
+
+    # Parents as bit positions, -1 for people with no parents listed
+    mothers, fathers = parent_indices(people, index)
+
+    # Running totals of the gene and trait probabilities, indexed by bit position
+    gene_totals = [[0, 0, 0] for person in people]
+    trait_totals = [[0, 0] for person in people]
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    # People whose trait is known, and those of them known to have it
+    known_trait = to_mask(index, (person for person in people if people[person]["trait"] is not None))
+    evidence = to_mask(index, (person for person in people if people[person]["trait"]))
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
+    # A trait only depends on the genes of its own person, so the sets of people
+    # who might have the trait are not looped over: the joint probability only
+    # includes the known traits, and the unknown ones are split by their odds.
+    # No gene count is ever known, so every set of people might have the gene
+    for one_gene in range(everyone + 1):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+        # Loop over all subsets of the people left, from all of them down to none
+        others = everyone & ~one_gene
+        two_genes = others
+        while True:
+
+            # Update probabilities with new joint probability
+            p = joint_probability_masks(mothers, fathers, one_gene, two_genes, evidence, known_trait)
+            update_masks(gene_totals, trait_totals, one_gene, two_genes, evidence, known_trait, p)
+
+            if two_genes == 0:
+                break
+            two_genes = (two_genes - 1) & others
+
+    # Copy the totals into the probabilities of each person
+    for person, i in index.items():
+        for gene_count in probabilities[person]["gene"]:
+            probabilities[person]["gene"][gene_count] = gene_totals[i][gene_count]
+        for has_trait in probabilities[person]["trait"]:
+            probabilities[person]["trait"][has_trait] = trait_totals[i][has_trait]
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
@@ -116,16 +148,28 @@ def load_data(filename):
     return data
 
 
-def powerset(s):
+def to_mask(index, people):
     """
-    Return a list of all possible subsets of set s.
+    Return the bitmask of the given people, `index` mapping each name to its bit.
     """
-    s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    mask = 0
+    for person in people:
+        mask |= 1 << index[person]
+    return mask
+
+
+def parent_indices(people, index):
+    """
+    Return the lists of the mother and father bit positions of each person,
+    in `index` order, using -1 for people with no parents listed.
+    """
+    mothers = [-1] * len(index)
+    fathers = [-1] * len(index)
+    for person, i in index.items():
+        if people[person]["mother"] is not None:
+            mothers[i] = index[people[person]["mother"]]
+            fathers[i] = index[people[person]["father"]]
+    return mothers, fathers
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -139,71 +183,66 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
-    
-    def calculate_parent_probability(gene_count, inherit_gene=True):
-        """ Parameters 
-            `has_genee` - Accepts true / false value if parents should or should not have the gene
-            `inherit_gene` - Accepts true / false value if the child inherit the gene
-
-            Returns the probability of a child inheriting or not inheriting a gene
-        """
-        if gene_count == 0:
-            if inherit_gene:
-                return PROBS["mutation"]
-            else:
-                return 1 - PROBS["mutation"]
-        
-        elif gene_count == 1:
-            return 0.5
-        
-        else:
-            if inherit_gene:
-                return 1 - PROBS["mutation"]
-            else:
-                return PROBS["mutation"]
-    
-    probability_records = []
+    index = {person: i for i, person in enumerate(people)}
+    mothers, fathers = parent_indices(people, index)
+    return joint_probability_masks(
+        mothers, fathers,
+        to_mask(index, one_gene), to_mask(index, two_genes), to_mask(index, have_trait),
+        (1 << len(people)) - 1
+    )
+
 
-    for person in people: 
+def joint_probability_masks(mothers, fathers, one_gene, two_genes, have_trait, known_trait):
+    """
+    Compute and return the joint probability of `joint_probability`, with
+    `one_gene`, `two_genes` and `have_trait` given as bitmasks and the
+    family given by the `mothers` and `fathers` lists of `parent_indices`.
+    Only the traits of the people in the `known_trait` bitmask are part of
+    the joint probability, the others may or may not have the trait.
+    """
+
+    # Count everyone's genes once, parents are looked up again for each of their children
+    genes = [count_gene(i, one_gene, two_genes) for i in range(len(mothers))]
+
+    probability_joint = 1
+
+    for i in range(len(mothers)):
         # Declare information for person
-        number_of_genes = count_gene(person, one_gene, two_genes)                # Number of gene for an individual
+        number_of_genes = genes[i]                                               # Number of gene for an individual
         individual_probability = 0                                               # Record probability of person having trait or no traint
 
         # if the person has no parents
-        mother_name = people[person]["mother"]
-        father_name = people[person]["father"]
-
-        if mother_name is None and father_name is None:
+        if mothers[i] == -1:
             # Probability of getting genes naturally
-            individual_probability = PROBS["gene"][number_of_genes]
+            individual_probability = GENE[number_of_genes]
 
         else:
-            mother_gene = count_gene(mother_name, one_gene, two_genes)
-            father_gene = count_gene(father_name, one_gene, two_genes)
+            mother_gene = genes[mothers[i]]
+            father_gene = genes[fathers[i]]
 
             if number_of_genes == 0:
                 # Do not inherit from both parents
-                individual_probability = calculate_parent_probability(mother_gene, inherit_gene=False) * calculate_parent_probability(father_gene, inherit_gene=False)
+                individual_probability = NO_INHERIT[mother_gene] * NO_INHERIT[father_gene]
             
             elif number_of_genes == 1:
                 # Inherit from mother = true, father = false + 
                 # Inherit from mother = false, father = true
-                individual_probability = calculate_parent_probability(mother_gene) * calculate_parent_probability(father_gene, inherit_gene=False)
-                individual_probability += calculate_parent_probability(mother_gene, inherit_gene=False) * calculate_parent_probability(father_gene)
+                individual_probability = INHERIT[mother_gene] * NO_INHERIT[father_gene]
+                individual_probability += NO_INHERIT[mother_gene] * INHERIT[father_gene]
             
             elif number_of_genes == 2:
                 # Inherit from mother = true, father = true
-                individual_probability = calculate_parent_probability(mother_gene) * calculate_parent_probability(father_gene)
+                individual_probability = INHERIT[mother_gene] * INHERIT[father_gene]
             
         # Calculate change to have / dont have trait with given genes
-        individual_probability *= PROBS['trait'][number_of_genes][person in have_trait]
-        probability_records.append(individual_probability)
-    
-    # Multiply all probability together
-    probability_joint = 1
-    for probability in probability_records:
-        probability_joint *= probability
-    
+        if known_trait >> i & 1:
+            individual_probability *= TRAIT[number_of_genes][have_trait >> i & 1]
+
+        # Multiply all probability together, no need to go on once it is 0
+        probability_joint *= individual_probability
+        if probability_joint == 0:
+            return 0.0
+
     return probability_joint
 
 
@@ -215,18 +254,33 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
     the person is in `have_gene` and `have_trait`, respectively.
     """
 
+    index = {person: i for i, person in enumerate(probabilities)}
+    one_gene = to_mask(index, one_gene)
+    two_genes = to_mask(index, two_genes)
+    have_trait = to_mask(index, have_trait)
+
     # Update each's person probability of having 'x' number of genes
     # Update each's person probability of having trait
-    for person in probabilities:
-        gene_count = 0
-        if person in one_gene:
-            gene_count = 1
-        elif person in two_genes:
-            gene_count = 2
+    for person, i in index.items():
+        probabilities[person]["gene"][count_gene(i, one_gene, two_genes)] += p
+        probabilities[person]["trait"][bool(have_trait >> i & 1)] += p
 
-        probabilities[person]["gene"][gene_count] += p
-        probabilities[person]["trait"][person in have_trait] += p
 
+def update_masks(gene_totals, trait_totals, one_gene, two_genes, have_trait, known_trait, p):
+    """
+    Add a new joint probability `p` to the running totals of each person's
+    gene count and trait, with `one_gene`, `two_genes` and `have_trait`
+    given as bitmasks. People not in the `known_trait` bitmask have `p`
+    split between having and not having the trait given their genes.
+    """
+    for i in range(len(gene_totals)):
+        gene_count = count_gene(i, one_gene, two_genes)
+        gene_totals[i][gene_count] += p
+        if known_trait >> i & 1:
+            trait_totals[i][have_trait >> i & 1] += p
+        else:
+            trait_totals[i][0] += p * TRAIT[gene_count][0]
+            trait_totals[i][1] += p * TRAIT[gene_count][1]
 
 
 def normalize(probabilities):
@@ -249,15 +303,15 @@ def normalize(probabilities):
             individual_probability["trait"][count] = 1 / total_probability_trait * score  
 
 
-def count_gene(person, one_gene, two_genes):
-    """ Counts the number of genes for a person
-        `one_gene` takes a set of people who has 1 gene
-        `two_genes` takes a set of people who has 2 gene
+def count_gene(i, one_gene, two_genes):
+    """ Counts the number of genes for the person at bit `i`
+        `one_gene` takes a bitmask of people who has 1 gene
+        `two_genes` takes a bitmask of people who has 2 gene
     """
 
-    if person in one_gene:
+    if one_gene >> i & 1:
         return 1
-    elif person in two_genes:
+    elif two_genes >> i & 1:
         return 2
     else:
         return 0
@@ -1,3 +1,5 @@
+import functools
+import itertools
 import os
 import random
 import re
@@ -74,19 +76,13 @@ def transition_model(corpus, page, damping_factor):
         model[current_page] = (1 - damping_factor) / len(corpus)
 
         # To prevent divide by 0 error if there is no links, prevents adding to itself
-        if damping_factor != 0.0 and current_page is not page:
+        if damping_factor != 0.0 and current_page != page:
             number_of_links = len(corpus[page])
             if page in corpus[page]:
                 number_of_links -= 1
             if current_page in corpus[page]:
                 model[current_page] += damping_factor / number_of_links
 
-    # # Print Testing - Should print the number 1 as total probability
-    # total_probability = 0
-    # for each_page, probability in model.items():
-    #     total_probability += probability
-    # print(f"transition_model(): Total Probability for {page} is : {total_probability}")
-
     return model
 
 
@@ -112,30 +108,26 @@ def sample_pagerank(corpus, damping_factor, n):
     current_page = random.choice(all_pages)
     pageCount_dict[current_page] += 1
 
+    # Returns the cumulative probabilities of moving from a page to each
+    # page of all_pages, worked out the first time the page is visited
+    @functools.lru_cache(maxsize=None)
+    def cumulative_model(page):
+        current_page_probabilities = transition_model(corpus, page, damping_factor)
+        return tuple(itertools.accumulate(
+            current_page_probabilities[other] for other in all_pages
+        ))
+
     # Sample n-1 times to random pages
     if (n - 1) >= 0: 
         for i in range(n - 1):
-            current_page_probabilities = transition_model(corpus, current_page, damping_factor)
-            possible_pages = []
-            possible_pages_proability = []
-            
-            for page, score in current_page_probabilities.items():
-                possible_pages.append(page)
-                possible_pages_proability.append(score)
-            
             # Sample based on probability
-            current_page = random.choices(possible_pages, weights=possible_pages_proability, k=1)[0]
+            current_page = random.choices(all_pages, cum_weights=cumulative_model(current_page), k=1)[0]
             pageCount_dict[current_page] += 1    
     
     # Get the distribution
     for page, count in pageCount_dict.items():
         pageCount_dict[page] = count / n
 
-    # Print Testing
-    total_probability = 0
-    for page, count in pageCount_dict.items():
-        total_probability += count
-
     # print(pageCount_dict)
     return pageCount_dict
 
@@ -1,3 +1,7 @@
+import bisect
+import itertools
+import math
+import multiprocessing
 import os
 import random
 import re
@@ -5,6 +9,24 @@ import sys
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 0.001
+
+# Iterations of iterate_pagerank between two convergence checks. In between,
+# only the pages still changing by more than SETTLED are updated
+CHECK_EVERY = 3
+SETTLED = TOLERANCE / 10
+
+# Samples from which sample_pagerank splits the walk between processes,
+# below it starting the processes costs more than they save
+PARALLEL_SAMPLES = 1_000_000
+
+# Cumulative transition tables of the walk in a sampling worker process,
+# handed over once when the worker starts rather than with every walk
+worker_cumulative = None
+
+# Matches the target of every link, compiled once for all the pages.
+# Pages are read as bytes so only the link targets need to be decoded
+LINK_PATTERN = re.compile(rb"<a\s+[^>]*?href=\"([^\"]*)\"")
 
 
 def main():
@@ -33,14 +55,16 @@ def crawl(directory):
     for filename in os.listdir(directory):
         if not filename.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
+        with open(os.path.join(directory, filename), "rb") as f:
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+            pages[filename] = {
+                match.group(1).decode() for match in LINK_PATTERN.finditer(contents)
+            } - {filename}
 
-    # Only include links to other pages in the corpus
+    # Only include links to other pages in the corpus. The links never
+    # change after crawling, so they are frozen for fast membership checks
     for filename in pages:
-        pages[filename] = set(
+        pages[filename] = frozenset(
             link for link in pages[filename]
             if link in pages
         )
@@ -57,39 +81,54 @@ def transition_model(corpus, page, damping_factor):
     linked to by `page`. With probability `1 - damping_factor`, choose
     a link at random chosen from all pages in the corpus.
     """
-    model = dict()
-
-    # Get all possible pages in corpus
-    possible_pages = corpus[page]
-    
-    # If the current page has no links out of the page, then damping factor = 0
-    # Chance to go to any random page becomes 100%
-    if len(possible_pages) == 0:
-        damping_factor = 0.0
-    
-    # Add all pages to the probability, and calculate the probability for each page using the following formula
-    # (1 - damping factor) / total number of pages + 
-    # damping factor / total number of links in the page    
-    for current_page, links in corpus.items():
-        model[current_page] = (1 - damping_factor) / len(corpus)
-
-        # To prevent divide by 0 error if there is no links, prevents adding to itself
-        if damping_factor != 0.0 and current_page is not page:
-            number_of_links = len(corpus[page])
-            if page in corpus[page]:
-                number_of_links -= 1
-            if current_page in corpus[page]:
-                model[current_page] += damping_factor / number_of_links
-
-    # # Print Testing - Should print the number 1 as total probability
-    # total_probability = 0
-    # for each_page, probability in model.items():
-    #     total_probability += probability
-    # print(f"transition_model(): Total Probability for {page} is : {total_probability}")
+    # Get the pages linked to by the current page
+    links = corpus[page]
+
+    # If the current page has no links out of the page,
+    # every page in the corpus is equally likely
+    if len(links) == 0:
+        return {current_page: 1 / len(corpus) for current_page in corpus}
+
+    # Calculate the probability for each page using the following formula
+    # (1 - damping factor) / total number of pages +
+    # damping factor / total number of links in the page, if the page is linked
+    base = (1 - damping_factor) / len(corpus)
+    share = damping_factor / len(links)
+    model = {
+        current_page: base + (share if current_page in links else 0.0)
+        for current_page in corpus
+    }
 
     return model
 
 
+def transition_rows(corpus, pages, damping_factor):
+    """
+    Return the transition model of every page as a list of probabilities,
+    in the order of `pages`: the i-th row gives the chance of moving from
+    page pages[i] to each page pages[j].
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    total = len(pages)
+    base = (1 - damping_factor) / total
+
+    rows = []
+    for page in pages:
+        links = corpus[page]
+
+        # A page with no links moves to any page with the same chance
+        if len(links) == 0:
+            rows.append([1 / total] * total)
+            continue
+
+        row = [base] * total
+        for link in links:
+            row[index[link]] += damping_factor / len(links)
+        rows.append(row)
+
+    return rows
+
+
 def sample_pagerank(corpus, damping_factor, n):
     """
     Return PageRank values for each page by sampling `n` pages
@@ -100,44 +139,78 @@ def sample_pagerank(corpus, damping_factor, n):
     PageRank values should sum to 1.
     """
     # Get all pages in corpus
-    all_pages = []
-    pageCount_dict = dict()     # Counts the number of time each page is visited
-
-    # Initialise all pagerank count to 0
-    for pages_name, linked_page in corpus.items():
-        all_pages.append(pages_name)
-        pageCount_dict[pages_name] = 0
-
-    # Get a random initial page
-    current_page = random.choice(all_pages)
-    pageCount_dict[current_page] += 1
-
-    # Sample n-1 times to random pages
-    if (n - 1) >= 0: 
-        for i in range(n - 1):
-            current_page_probabilities = transition_model(corpus, current_page, damping_factor)
-            possible_pages = []
-            possible_pages_proability = []
-            
-            for page, score in current_page_probabilities.items():
-                possible_pages.append(page)
-                possible_pages_proability.append(score)
-            
-            # Sample based on probability
-            current_page = random.choices(possible_pages, weights=possible_pages_proability, k=1)[0]
-            pageCount_dict[current_page] += 1    
-    
+    all_pages = list(corpus)
+
+    # The transition model of a page never changes, so the cumulative
+    # probabilities of moving to each page are worked out once per page
+    cumulative = [
+        list(itertools.accumulate(row))
+        for row in transition_rows(corpus, all_pages, damping_factor)
+    ]
+
+    # Short walks, and any walk on a single processor, are sampled here
+    # from the global random generator
+    workers = os.cpu_count() or 1
+    if n < PARALLEL_SAMPLES or workers == 1:
+        current = random.randrange(len(all_pages))
+        counts = sample_walk(cumulative, current, n, random.random)
+
+    # Long walks are split into one independent walk per processor, each
+    # with its own generator seeded from the global one
+    else:
+        walks = [
+            (n // workers + (worker < n % workers), random.getrandbits(64))
+            for worker in range(workers)
+        ]
+        with multiprocessing.Pool(workers, start_sampling_worker, (cumulative,)) as pool:
+            results = pool.starmap(sample_seeded_walk, walks)
+        counts = [sum(visits) for visits in zip(*results)]
+
     # Get the distribution
-    for page, count in pageCount_dict.items():
-        pageCount_dict[page] = count / n
+    return {page: count / n for page, count in zip(all_pages, counts)}
+
 
-    # Print Testing
-    total_probability = 0
-    for page, count in pageCount_dict.items():
-        total_probability += count
+def sample_walk(cumulative, current, n, rand):
+    """
+    Return how many times each page is visited by a walk of `n` pages
+    starting at page number `current`, where cumulative[i] holds the
+    cumulative probabilities of moving from page i to each page and
+    `rand` returns random numbers between 0 and 1.
+    """
+    # Counts the number of time each page is visited, by page number
+    counts = [0] * len(cumulative)
+    counts[current] += 1
+
+    # Sample n-1 times to random pages, by finding where a random point
+    # along the cumulative probabilities of the current page falls.
+    # The functions are bound to local names as the loop runs n times
+    find = bisect.bisect
+    last = len(cumulative) - 1
+    for i in range(n - 1):
+        weights = cumulative[current]
+        current = find(weights, rand() * weights[-1], 0, last)
+        counts[current] += 1
 
-    # print(pageCount_dict)
-    return pageCount_dict
+    return counts
+
+
+def start_sampling_worker(cumulative):
+    """
+    Keep the cumulative transition tables for the walks of this worker process.
+    """
+    global worker_cumulative
+    worker_cumulative = cumulative
+
+
+def sample_seeded_walk(n, seed):
+    """
+    Return how many times each page is visited by a walk of `n` pages
+    from a random page, drawn from a random generator seeded with `seed`,
+    over the tables given to start_sampling_worker.
+    """
+    generator = random.Random(seed)
+    current = generator.randrange(len(worker_cumulative))
+    return sample_walk(worker_cumulative, current, n, generator.random)
 
 
 def iterate_pagerank(corpus, damping_factor):
@@ -154,44 +227,112 @@ def iterate_pagerank(corpus, damping_factor):
     # n is the total number of pages in the corpus
     # i is all pages that links to p
     # numlinks(i) is the number of links present on (i)
-    
-    ranking = dict()
-    prevRank = dict()
-    rank_check = True
-
-    for page, links in corpus.items():
-        prevRank[page] = 1 / len(corpus)
-
-    while rank_check:
-        # Stop repeating
-        rank_check = False
-        
-        for page, score in prevRank.items():
-            # Check if any references to current page
-            reference_list = []  # Contains score / number of links
-            
-            # Calculate the first part of the formula
-            ranking[page] = (1 - damping_factor) / len(corpus)
-
-            # For all items, if the current page appear as a reference
-            for reference, referencelink in corpus.items():
-                if page in referencelink and page is not reference:
-                    reference_list.append(prevRank[reference] / len(referencelink))
-                elif len(referencelink) == 0:
-                    reference_list.append(prevRank[reference] / len(corpus))
-            
-            # Calculate new score=
-            ranking[page] += (damping_factor * sum(reference_list))
-                
-            # Check for >= 0.001 variance
-            if abs(prevRank[page] - ranking[page]) >= 0.001:
-                rank_check = True
-        
-        prevRank = ranking.copy()
-
-    # print(f"{sum(ranking.values())}")
-    
-    return ranking
+    # A page with no links counts as linking to every page, itself included
+
+    # Number the pages once, so that ranks are kept in lists
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+
+    # The matrix of link chances is sparse, so only the links are kept,
+    # turned around so that each page reads the ranks it gets in one pass:
+    # linkedFrom[i] holds the numbers of the pages linking to page i
+    linkedFrom = [[] for _ in pages]
+    for j, page in enumerate(pages):
+        for link in corpus[page]:
+            linkedFrom[index[link]].append(j)
+    dangling = [j for j, page in enumerate(pages) if len(corpus[page]) == 0]
+
+    # The share of its rank a page passes along each of its links, worked
+    # out once so iterations multiply instead of divide
+    shares = [1 / len(corpus[page]) if corpus[page] else 0.0 for page in pages]
+
+    ranking = power_iteration(
+        linkedFrom, shares, dangling, damping_factor,
+        TOLERANCE, SETTLED, iteration_bound(damping_factor, TOLERANCE)
+    )
+    return dict(zip(pages, ranking))
+
+
+def power_iteration(linkedFrom, shares, dangling, damping_factor, tolerance, settled, maxIterations):
+    """
+    Return the list of PageRank values of pages numbered 0 to N - 1, where
+    linkedFrom[i] lists the pages linking to page i, shares[j] is one over
+    the number of links of page j and `dangling` lists the pages with no links.
+
+    Iterates at most `maxIterations` times, stopping early once the values
+    change by less than `tolerance` in total. Values changing by less than
+    `settled` are only updated every CHECK_EVERY iterations.
+    """
+    total = len(linkedFrom)
+    base = (1 - damping_factor) / total
+
+    # Ranks are updated in place, so pages later in an iteration already
+    # use the new ranks of the pages before them, which converges faster
+    ranking = [1 / total] * total
+
+    # passed[j] is the damped rank page j passes along each of its links,
+    # kept up to date with its rank so it is only scaled once per update
+    shares = [damping_factor * share for share in shares]
+    passed = [rank * share for rank, share in zip(ranking, shares)]
+
+    # Pages whose rank is still moving, all of them at first
+    active = range(total)
+
+    for iteration in range(1, maxIterations + 1):
+        # Every page is updated on the iterations that check for convergence,
+        # so that settled pages do not go stale. Other iterations only update
+        # the active pages and keep the ranks of the others
+        check = iteration % CHECK_EVERY == 0
+        rows = range(total) if check else active
+        changes = []
+
+        # Every page gets the teleport chance plus the damped rank of the
+        # pages with no links, which share their rank with every page.
+        # It is kept up to date as their ranks change during the iteration
+        teleport = base + damping_factor * sum(ranking[j] for j in dangling) / total
+
+        # Each page gets the rank of the pages linking to it, shared evenly
+        # between the links of each of them
+        for i in rows:
+            new = teleport + sum(passed[j] for j in linkedFrom[i])
+            old = ranking[i]
+            ranking[i] = new
+            if shares[i]:
+                passed[i] = new * shares[i]
+            else:
+                teleport += damping_factor * (new - old) / total
+            if check:
+                changes.append(abs(new - old))
+
+        # Stop once the ranks changed by less than tolerance all together,
+        # so no page changed by tolerance or more. A few extra iterations
+        # cost less than checking after every one of them
+        if check:
+            if sum(changes) < tolerance:
+                break
+            active = [i for i, change in enumerate(changes) if change >= settled]
+
+    # Updating in place does not keep the sum of the ranks at exactly 1
+    # before convergence, so scale what is left over away
+    rankSum = sum(ranking)
+    return [rank / rankSum for rank in ranking]
+
+
+def iteration_bound(damping_factor, tolerance):
+    """
+    Return how many iterations of `iterate_pagerank` are enough to get
+    within `tolerance` of the PageRank values. The error shrinks by
+    `damping_factor` every iteration, so that takes log(tolerance) / log(d).
+    """
+    # With no damping the first iteration is already exact
+    if damping_factor <= 0:
+        return 1
+
+    # Without teleporting there is no bound, run until the ranks settle
+    if damping_factor >= 1:
+        return sys.maxsize
+
+    return math.ceil(math.log(tolerance) / math.log(damping_factor)) + 5
 
 
 if __name__ == "__main__":